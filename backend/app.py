@@ -1,28 +1,80 @@
-from flask import Flask, request, jsonify, render_template, send_from_directory
+from flask import Flask, request, jsonify, render_template, send_from_directory, Response
 from flask_cors import CORS
 import os
+import re
 import threading
 import time
-from datetime import datetime
+from datetime import datetime, timezone
 
+from compression import ResponseCompressor
 from database import DatabaseManager
+from domain_router import DomainRouter
+from email_cache import EmailDetailCache
 from email_generator import TempEmailGenerator
 from email_sender import EmailSender
+from json_provider import FastJSONProvider
+from mailbox_export import MailboxExporter
+from rate_limiter import RateLimiter
+from raw_store import RawMessageStore
+from read_state import ReadStateBuffer
 from smtp_server import SMTPServer
 
 app = Flask(__name__, template_folder='../frontend', static_folder='../frontend/static')
+app.json = FastJSONProvider(app)
 CORS(app)
+ResponseCompressor(app)
 
 # إعداد قاعدة البيانات والخدمات
-db_manager = DatabaseManager()
-email_generator = TempEmailGenerator()
+# لا يتم أي عمل على القرص أو الشبكة هنا؛ الخدمات تبدأ عبر start_services()
+db_manager = DatabaseManager(os.environ.get('DATABASE_PATH', 'database/tempmail.db'))
+raw_store = RawMessageStore(
+    db_manager, os.path.join(os.path.dirname(db_manager.db_path), 'raw')
+)
+domain_router = DomainRouter(os.environ.get(
+    'DOMAINS_CONFIG', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'domains.json')
+))
+email_generator = TempEmailGenerator(domain_router)
+email_cache = EmailDetailCache()
+mailbox_exporter = MailboxExporter(raw_store)
+read_state = ReadStateBuffer(db_manager)
+rate_limiter = RateLimiter()
+smtp_server = SMTPServer(
+    port=int(os.environ.get('SMTP_PORT', 1025)),
+    db_manager=db_manager,
+    raw_store=raw_store,
+    domain_router=domain_router
+)
+email_sender = EmailSender(smtp_port=smtp_server.port)
 
-# بدء خادم SMTP في thread منفصل
-smtp_server = SMTPServer()
-smtp_server.start()
+WEB_PORT = int(os.environ.get('WEB_PORT', 5000))
 
-# إعداد email_sender مع المنفذ الصحيح
-email_sender = EmailSender(smtp_port=smtp_server.port)
+_services_lock = threading.Lock()
+_services_started = False
+
+def start_services():
+    """تهيئة قاعدة البيانات وبدء خادم SMTP والمهام الدورية (مرة واحدة فقط)"""
+    global _services_started
+    
+    with _services_lock:
+        if _services_started:
+            return
+        
+        db_manager.initialize()
+        
+        # بدء خادم SMTP في thread منفصل
+        smtp_server.start()
+        
+        # إعداد email_sender مع المنفذ الصحيح
+        email_sender.smtp_port = smtp_server.port
+        
+        read_state.start()
+        
+        # بدء thread التنظيف الدوري
+        cleanup_thread = threading.Thread(target=periodic_cleanup)
+        cleanup_thread.daemon = True
+        cleanup_thread.start()
+        
+        _services_started = True
 
 @app.route('/')
 def index():
@@ -30,6 +82,7 @@ def index():
     return render_template('index.html')
 
 @app.route('/api/generate-email', methods=['POST'])
+@rate_limiter.limit(10, 60)
 def generate_email():
     """API لتوليد بريد إلكتروني مؤقت جديد"""
     try:
@@ -37,6 +90,13 @@ def generate_email():
         method = data.get('method', 'random')
         prefix = data.get('prefix', '')
         
+        # إعدادات تحتوي على نطاقات wildcard أو '*' فقط لا تسمح بالتوليد
+        if not email_generator.get_available_domains():
+            return jsonify({
+                'success': False,
+                'message': 'لا توجد نطاقات محددة متاحة لتوليد العناوين'
+            }), 400
+        
         # توليد بريد إلكتروني جديد
         if method == 'word_based':
             new_email = email_generator.generate_word_based_email()
@@ -47,8 +107,11 @@ def generate_email():
         else:
             new_email = email_generator.generate_random_email()
         
-        # إنشاء الحساب في قاعدة البيانات
-        account_id = db_manager.create_temp_account(new_email)
+        # إنشاء الحساب في قاعدة البيانات (مدة الصلاحية حسب سياسة النطاق)
+        policy = domain_router.match(new_email)
+        account_id = db_manager.create_temp_account(
+            new_email, expires_in_hours=policy.ttl_hours
+        )
         
         if account_id:
             # إرسال رسالة ترحيب
@@ -73,19 +136,34 @@ def generate_email():
         }), 500
 
 @app.route('/api/emails/<email_address>', methods=['GET'])
+@rate_limiter.limit(120, 60)
+@rate_limiter.limit(30, 60, key='account')
 def get_emails(email_address):
     """API للحصول على رسائل حساب معين"""
     try:
         # التحقق من وجود الحساب
         account = db_manager.get_temp_account(email_address)
         if not account:
+            # في وضع catch-all يمكن استخدام أي عنوان قبل وصول أول رسالة إليه
+            policy = domain_router.match(email_address)
+            if policy is not None and policy.catch_all:
+                return jsonify({
+                    'success': True,
+                    'emails': [],
+                    'account': {
+                        'email': email_address,
+                        'created_at': None,
+                        'expires_at': None
+                    }
+                })
+            
             return jsonify({
                 'success': False,
                 'message': 'الحساب غير موجود أو منتهي الصلاحية'
             }), 404
         
         # الحصول على الرسائل
-        emails = db_manager.get_emails(account['id'])
+        emails = read_state.overlay(db_manager.get_emails(account['id']))
         
         return jsonify({
             'success': True,
@@ -104,6 +182,7 @@ def get_emails(email_address):
         }), 500
 
 @app.route('/api/email/<int:email_id>/<email_address>', methods=['GET'])
+@rate_limiter.limit(120, 60)
 def get_email_details(email_id, email_address):
     """API للحصول على تفاصيل رسالة محددة"""
     try:
@@ -115,6 +194,11 @@ def get_email_details(email_id, email_address):
                 'message': 'الحساب غير موجود أو منتهي الصلاحية'
             }), 404
         
+        # الرسائل لا تتغير بعد حفظها، لذا نعيد الاستجابة المخزنة إن وجدت
+        cached = email_cache.get(account['id'], email_id)
+        if cached is not None:
+            return app.response_class(cached, mimetype='application/json')
+        
         # الحصول على تفاصيل الرسالة
         email_details = db_manager.get_email(email_id, account['id'])
         if not email_details:
@@ -123,13 +207,171 @@ def get_email_details(email_id, email_address):
                 'message': 'الرسالة غير موجودة'
             }), 404
         
-        # تحديد الرسالة كمقروءة
-        db_manager.mark_email_as_read(email_id)
+        # تحديد الرسالة كمقروءة (تُكتب لاحقاً ضمن دفعة، ولا شيء إذا كانت مقروءة)
+        read_state.overlay(email_details)
+        if not email_details['is_read']:
+            read_state.mark_read(email_id)
+            email_details['is_read'] = 1
         
-        return jsonify({
+        payload = app.json.dumps_bytes({
             'success': True,
             'email': email_details
         })
+        email_cache.put(account['id'], email_id, payload, account['expires_at'])
+        
+        return app.response_class(payload, mimetype='application/json')
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'خطأ: {str(e)}'
+        }), 500
+
+@app.route('/api/email/<int:email_id>/<email_address>/raw', methods=['GET'])
+@rate_limiter.limit(60, 60)
+def get_raw_email(email_id, email_address):
+    """API لتنزيل الرسالة الأصلية كملف .eml"""
+    try:
+        account = db_manager.get_temp_account(email_address)
+        if not account:
+            return jsonify({
+                'success': False,
+                'message': 'الحساب غير موجود أو منتهي الصلاحية'
+            }), 404
+        
+        location = db_manager.get_raw_location(email_id, account['id'])
+        if not location:
+            return jsonify({
+                'success': False,
+                'message': 'النسخة الأصلية للرسالة غير متوفرة'
+            }), 404
+        
+        # فتح الملف قبل بناء الاستجابة حتى يُعاد 404 إذا حُذف الـ segment
+        try:
+            message = raw_store.open_message(
+                location['segment'], location['offset'], location['length']
+            )
+        except OSError:
+            return jsonify({
+                'success': False,
+                'message': 'النسخة الأصلية للرسالة غير متوفرة'
+            }), 404
+        
+        response = Response(message, mimetype='message/rfc822', direct_passthrough=True)
+        response.headers['Content-Length'] = str(location['length'])
+        response.headers['Content-Disposition'] = f'attachment; filename="email-{email_id}.eml"'
+        return response
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'خطأ: {str(e)}'
+        }), 500
+
+EXPORT_FORMATS = {
+    'mbox': ('application/mbox', 'mbox'),
+    'zip': ('application/zip', 'zip')
+}
+
+def parse_export_time(value):
+    """تحويل وقت ISO من الاستعلام إلى صيغة received_at في قاعدة البيانات"""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    # received_at بتوقيت UTC؛ الأوقات بدون منطقة زمنية تُعامل كـ UTC
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc)
+    return parsed.strftime('%Y-%m-%d %H:%M:%S')
+
+@app.route('/api/emails/<email_address>/export', methods=['GET'])
+@rate_limiter.limit(5, 60)
+def export_emails(email_address):
+    """API لتصدير رسائل حساب (mbox أو zip من ملفات .eml) بشكل متدفق"""
+    try:
+        export_format = request.args.get('format', 'mbox')
+        if export_format not in EXPORT_FORMATS:
+            return jsonify({
+                'success': False,
+                'message': 'صيغة التصدير يجب أن تكون mbox أو zip'
+            }), 400
+        
+        try:
+            since = parse_export_time(request.args.get('since'))
+            until = parse_export_time(request.args.get('until'))
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'message': 'صيغة الوقت غير صالحة (ISO 8601)'
+            }), 400
+        
+        account = db_manager.get_temp_account(email_address)
+        if not account:
+            return jsonify({
+                'success': False,
+                'message': 'الحساب غير موجود أو منتهي الصلاحية'
+            }), 404
+        
+        rows = db_manager.iter_emails(account['id'], since, until)
+        if export_format == 'zip':
+            chunks = mailbox_exporter.iter_zip(rows)
+        else:
+            chunks = mailbox_exporter.iter_mbox(rows)
+        
+        mimetype, extension = EXPORT_FORMATS[export_format]
+        response = Response(chunks, mimetype=mimetype, direct_passthrough=True)
+        filename = re.sub(r'[^\w.-]', '_', email_address)
+        response.headers['Content-Disposition'] = f'attachment; filename="{filename}.{extension}"'
+        return response
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'خطأ: {str(e)}'
+        }), 500
+
+@app.route('/api/emails/<email_address>/read', methods=['POST'])
+@rate_limiter.limit(30, 60)
+def mark_emails_read(email_address):
+    """API لتحديد عدة رسائل (أو جميعها) كمقروءة أو غير مقروءة"""
+    try:
+        data = request.get_json(silent=True) or {}
+        email_ids = data.get('ids')
+        is_read = data.get('is_read', True)
+        
+        if not isinstance(is_read, bool):
+            return jsonify({
+                'success': False,
+                'message': 'قيمة is_read يجب أن تكون true أو false'
+            }), 400
+        
+        if email_ids is not None and (
+            not isinstance(email_ids, list) or len(email_ids) > 500
+            or not all(isinstance(i, int) for i in email_ids)
+        ):
+            return jsonify({
+                'success': False,
+                'message': 'قائمة المعرفات غير صالحة (500 كحد أقصى)'
+            }), 400
+        
+        account = db_manager.get_temp_account(email_address)
+        if not account:
+            return jsonify({
+                'success': False,
+                'message': 'الحساب غير موجود أو منتهي الصلاحية'
+            }), 404
+        
+        # الحالة الفعلية = قاعدة البيانات + التغييرات التي لم تُكتب بعد
+        states = read_state.overlay(db_manager.get_read_states(account['id'], email_ids))
+        ids = [row['id'] for row in states if bool(row['is_read']) != is_read]
+        
+        read_state.set_state(ids, is_read)
+        for email_id in ids:
+            email_cache.invalidate(account['id'], email_id)
+        
+        return jsonify({
+            'success': True,
+            'updated': len(ids)
+        })
         
     except Exception as e:
         return jsonify({
@@ -138,6 +380,8 @@ def get_email_details(email_id, email_address):
         }), 500
 
 @app.route('/api/send-email', methods=['POST'])
+@rate_limiter.limit(20, 60)
+@rate_limiter.limit(10, 60, key='account')
 def send_email():
     """API لإرسال رسالة إلكترونية"""
     try:
@@ -190,11 +434,34 @@ def get_domains():
             'message': f'خطأ: {str(e)}'
         }), 500
 
+@app.route('/api/domains/reload', methods=['POST'])
+@rate_limiter.limit(5, 60)
+def reload_domains():
+    """API لإعادة تحميل ملف إعدادات النطاقات دون إعادة التشغيل"""
+    try:
+        if not domain_router.config_path or not domain_router.reload():
+            return jsonify({
+                'success': False,
+                'message': 'فشل في تحميل ملف إعدادات النطاقات'
+            }), 500
+        
+        return jsonify({
+            'success': True,
+            'domains': domain_router.get_available_domains()
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'خطأ: {str(e)}'
+        }), 500
+
 @app.route('/api/cleanup', methods=['POST'])
+@rate_limiter.limit(5, 60)
 def cleanup_database():
     """API لتنظيف قاعدة البيانات"""
     try:
-        db_manager.cleanup_database()
+        cleanup_expired()
         return jsonify({
             'success': True,
             'message': 'تم تنظيف قاعدة البيانات بنجاح'
@@ -213,28 +480,34 @@ def get_server_info():
         'smtp_host': smtp_server.host,
         'smtp_port': smtp_server.port,
         'web_host': '0.0.0.0',
-        'web_port': 5000,
-        'status': 'running'
+        'web_port': WEB_PORT,
+        'status': 'running' if _services_started else 'stopped'
     })
 
+def cleanup_expired():
+    """حذف الحسابات المنتهية مع رسائلها المخزنة مؤقتاً وأرشيفها الخام"""
+    expired_ids = db_manager.cleanup_database()
+    email_cache.evict_accounts(expired_ids)
+    raw_store.remove_expired_segments()
+
 def periodic_cleanup():
     """تنظيف دوري لقاعدة البيانات كل ساعة"""
     while True:
         time.sleep(3600)  # انتظار ساعة واحدة
         try:
-            db_manager.cleanup_database()
+            cleanup_expired()
             print("تم تنظيف قاعدة البيانات بنجاح")
         except Exception as e:
             print(f"خطأ في تنظيف قاعدة البيانات: {str(e)}")
 
-# بدء thread التنظيف الدوري
-cleanup_thread = threading.Thread(target=periodic_cleanup)
-cleanup_thread.daemon = True
-cleanup_thread.start()
-
 if __name__ == '__main__':
-    print("بدء تشغيل خادم Temp Mail...")
-    print(f"SMTP Server: {smtp_server.host}:{smtp_server.port}")
-    print("Web Server: http://localhost:5000")
+    # في وضع debug يعيد reloader تشغيل التطبيق في عملية فرعية؛
+    # نبدأ الخدمات فيها فقط حتى لا يُحجز منفذ SMTP مرتين
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_services()
+        print(f"SMTP Server: {smtp_server.host}:{smtp_server.port}")
+    else:
+        print("بدء تشغيل خادم Temp Mail...")
+        print(f"Web Server: http://localhost:{WEB_PORT}")
     
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    app.run(debug=True, host='0.0.0.0', port=WEB_PORT)
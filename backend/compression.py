@@ -0,0 +1,61 @@
+import gzip
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # brotli اختياري
+    brotli = None
+
+
+class ResponseCompressor:
+    """ضغط الاستجابات (brotli أو gzip) حسب Accept-Encoding
+
+    يتم تجاهل الاستجابات الأصغر من min_size والاستجابات المتدفقة
+    (streaming) والاستجابات المضغوطة مسبقاً.
+    """
+
+    def __init__(self, app=None, min_size=1024, gzip_level=6, brotli_quality=4):
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.after_request(self.compress_response)
+
+    def choose_encoding(self):
+        """اختيار أفضل ترميز يدعمه العميل"""
+        accepted = request.accept_encodings
+        if brotli is not None and accepted['br']:
+            return 'br'
+        if accepted['gzip']:
+            return 'gzip'
+        return None
+
+    def compress(self, data, encoding):
+        if encoding == 'br':
+            return brotli.compress(data, quality=self.brotli_quality)
+        return gzip.compress(data, compresslevel=self.gzip_level)
+
+    def compress_response(self, response):
+        response.vary.add('Accept-Encoding')
+
+        if (
+            response.direct_passthrough
+            or response.is_streamed
+            or not 200 <= response.status_code < 300
+            or 'Content-Encoding' in response.headers
+            or response.content_length is None
+            or response.content_length < self.min_size
+        ):
+            return response
+
+        encoding = self.choose_encoding()
+        if encoding is None:
+            return response
+
+        response.set_data(self.compress(response.get_data(), encoding))
+        response.headers['Content-Encoding'] = encoding
+        return response
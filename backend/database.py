@@ -1,28 +1,54 @@
 import sqlite3
 from datetime import datetime, timedelta
 import os
+import threading
+from pathlib import Path
+
+
+def dict_factory(cursor, row):
+    """تحويل الصف مباشرة إلى dict دون المرور بـ sqlite3.Row ثم نسخه"""
+    columns = [column[0] for column in cursor.description]
+    return dict(zip(columns, row))
+
 
 class DatabaseManager:
     def __init__(self, db_path="database/tempmail.db"):
         self.db_path = db_path
-        self.ensure_database_exists()
-        self.create_tables()
+        self._initialized = False
+        self._init_lock = threading.Lock()
+    
+    def initialize(self):
+        """إنشاء المجلد والجداول (مرة واحدة، عند أول استخدام)"""
+        with self._init_lock:
+            if self._initialized:
+                return
+            self.ensure_database_exists()
+            self.create_tables()
+            self._initialized = True
     
     def ensure_database_exists(self):
         """تأكد من وجود مجلد قاعدة البيانات"""
-        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
     
-    def get_connection(self):
-        """إنشاء اتصال بقاعدة البيانات"""
+    def _connect(self):
         conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        conn.row_factory = dict_factory
         return conn
     
+    def get_connection(self):
+        """إنشاء اتصال بقاعدة البيانات"""
+        if not self._initialized:
+            self.initialize()
+        return self._connect()
+    
     def create_tables(self):
         """إنشاء جداول قاعدة البيانات"""
-        conn = self.get_connection()
+        conn = self._connect()
         cursor = conn.cursor()
         
+        # وضع WAL يسمح للقراءة بالتزامن مع الكتابة
+        cursor.execute('PRAGMA journal_mode=WAL')
+        
         # جدول الحسابات المؤقتة
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS temp_accounts (
@@ -47,10 +73,35 @@ class DatabaseManager:
                 html_body TEXT,
                 received_at DATETIME DEFAULT CURRENT_TIMESTAMP,
                 is_read BOOLEAN DEFAULT 0,
+                size INTEGER DEFAULT 0,
                 FOREIGN KEY (temp_account_id) REFERENCES temp_accounts (id)
             )
         ''')
         
+        # قواعد بيانات قديمة أُنشئت قبل إضافة عمود الحجم
+        self._ensure_column(cursor, 'emails', 'size', 'INTEGER DEFAULT 0')
+        
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_emails_account
+            ON emails (temp_account_id)
+        ''')
+        
+        # مواقع الرسائل الخام في ملفات الأرشيف (raw_store.py)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS raw_messages (
+                email_id INTEGER PRIMARY KEY,
+                segment TEXT NOT NULL,
+                offset INTEGER NOT NULL,
+                length INTEGER NOT NULL,
+                FOREIGN KEY (email_id) REFERENCES emails (id)
+            )
+        ''')
+        
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_raw_messages_segment
+            ON raw_messages (segment)
+        ''')
+        
         # جدول المرفقات
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS attachments (
@@ -66,6 +117,13 @@ class DatabaseManager:
         conn.commit()
         conn.close()
     
+    def _ensure_column(self, cursor, table, column, definition):
+        """إضافة عمود إلى جدول موجود إذا لم يكن موجوداً"""
+        cursor.execute(f'PRAGMA table_info({table})')
+        columns = [row['name'] for row in cursor.fetchall()]
+        if column not in columns:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+    
     def create_temp_account(self, email, password=None, expires_in_hours=24):
         """إنشاء حساب مؤقت جديد"""
         conn = self.get_connection()
@@ -99,23 +157,81 @@ class DatabaseManager:
         
         account = cursor.fetchone()
         conn.close()
-        return dict(account) if account else None
+        return account
     
-    def save_email(self, temp_account_id, sender, recipient, subject, body, html_body=None):
+    def save_email(self, temp_account_id, sender, recipient, subject, body, html_body=None, size=0):
         """حفظ رسالة جديدة"""
         conn = self.get_connection()
         cursor = conn.cursor()
         
         cursor.execute('''
-            INSERT INTO emails (temp_account_id, sender, recipient, subject, body, html_body)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (temp_account_id, sender, recipient, subject, body, html_body))
+            INSERT INTO emails (temp_account_id, sender, recipient, subject, body, html_body, size)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (temp_account_id, sender, recipient, subject, body, html_body, size))
         
         email_id = cursor.lastrowid
         conn.commit()
         conn.close()
         return email_id
     
+    def save_email_for_address(self, email, expires_in_hours, sender, recipient, subject,
+                               body, html_body=None, size=0):
+        """حفظ رسالة مع إنشاء الحساب عند الحاجة في نفس المعاملة (وضع catch-all)
+
+        يعيد (email_id, account)
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        expires_at = datetime.now() + timedelta(hours=expires_in_hours)
+        
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            
+            # حساب سابق منتهي بنفس العنوان لا يجب أن يمنع إنشاء حساب جديد
+            cursor.execute('''
+                DELETE FROM temp_accounts
+                WHERE email = ? AND (is_active = 0 OR expires_at <= datetime('now'))
+            ''', (email,))
+            
+            cursor.execute('''
+                INSERT OR IGNORE INTO temp_accounts (email, expires_at)
+                VALUES (?, ?)
+            ''', (email, expires_at))
+            
+            cursor.execute('''
+                SELECT * FROM temp_accounts WHERE email = ?
+            ''', (email,))
+            account = cursor.fetchone()
+            
+            cursor.execute('''
+                INSERT INTO emails (temp_account_id, sender, recipient, subject, body, html_body, size)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (account['id'], sender, recipient, subject, body, html_body, size))
+            
+            email_id = cursor.lastrowid
+            conn.commit()
+            return email_id, account
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+    
+    def get_account_usage(self, temp_account_id):
+        """عدد رسائل الحساب وحجمها الإجمالي بالبايت"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT COUNT(*) AS message_count, COALESCE(SUM(size), 0) AS total_bytes
+            FROM emails WHERE temp_account_id = ?
+        ''', (temp_account_id,))
+        
+        usage = cursor.fetchone()
+        conn.close()
+        return usage['message_count'], usage['total_bytes']
+    
     def get_emails(self, temp_account_id):
         """الحصول على جميع رسائل الحساب المؤقت"""
         conn = self.get_connection()
@@ -127,10 +243,43 @@ class DatabaseManager:
             ORDER BY received_at DESC
         ''', (temp_account_id,))
         
-        emails = [dict(row) for row in cursor.fetchall()]
+        emails = cursor.fetchall()
         conn.close()
         return emails
     
+    def iter_emails(self, temp_account_id, since=None, until=None, chunk_size=100):
+        """قراءة رسائل الحساب على دفعات (مع موقع النسخة الخام إن وجدت)
+
+        since / until: نص بصيغة 'YYYY-MM-DD HH:MM:SS' (UTC مثل received_at)
+        """
+        conn = self.get_connection()
+        
+        query = '''
+            SELECT e.*, r.segment, r.offset, r.length FROM emails e
+            LEFT JOIN raw_messages r ON r.email_id = e.id
+            WHERE e.temp_account_id = ?
+        '''
+        params = [temp_account_id]
+        
+        if since:
+            query += ' AND e.received_at >= ?'
+            params.append(since)
+        if until:
+            query += ' AND e.received_at < ?'
+            params.append(until)
+        
+        query += ' ORDER BY e.received_at, e.id'
+        
+        try:
+            cursor = conn.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            conn.close()
+    
     def get_email(self, email_id, temp_account_id):
         """الحصول على رسالة محددة"""
         conn = self.get_connection()
@@ -143,33 +292,117 @@ class DatabaseManager:
         
         email = cursor.fetchone()
         conn.close()
-        return dict(email) if email else None
+        return email
+    
+    def save_raw_location(self, email_id, segment, offset, length):
+        """حفظ موقع الرسالة الخام في الأرشيف"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            INSERT OR REPLACE INTO raw_messages (email_id, segment, offset, length)
+            VALUES (?, ?, ?, ?)
+        ''', (email_id, segment, offset, length))
+        
+        conn.commit()
+        conn.close()
     
-    def mark_email_as_read(self, email_id):
-        """تحديد الرسالة كمقروءة"""
+    def get_raw_location(self, email_id, temp_account_id):
+        """الحصول على موقع الرسالة الخام إذا كانت تابعة للحساب"""
         conn = self.get_connection()
         cursor = conn.cursor()
         
         cursor.execute('''
-            UPDATE emails SET is_read = 1 WHERE id = ?
-        ''', (email_id,))
+            SELECT r.segment, r.offset, r.length FROM raw_messages r
+            JOIN emails e ON e.id = r.email_id
+            WHERE r.email_id = ? AND e.temp_account_id = ?
+        ''', (email_id, temp_account_id))
+        
+        location = cursor.fetchone()
+        conn.close()
+        return location
+    
+    def delete_raw_locations(self, segments):
+        """حذف مواقع الرسائل الخام التابعة لـ segments محذوفة"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.executemany('''
+            DELETE FROM raw_messages WHERE segment = ?
+        ''', [(segment,) for segment in segments])
+        
+        conn.commit()
+        conn.close()
+    
+    def set_read_state_many(self, updates):
+        """تحديث حالة القراءة لعدة رسائل في معاملة واحدة
+
+        updates: أزواج (email_id, is_read)
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.executemany('''
+            UPDATE emails SET is_read = ? WHERE id = ? AND is_read != ?
+        ''', [(state, email_id, state) for email_id, state in updates])
         
         conn.commit()
         conn.close()
     
+    def get_read_states(self, temp_account_id, email_ids=None):
+        """الحصول على حالة القراءة لرسائل الحساب (أو لرسائل محددة منه)"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        query = 'SELECT id, is_read FROM emails WHERE temp_account_id = ?'
+        params = [temp_account_id]
+        
+        if email_ids is not None:
+            query += ' AND id IN (%s)' % ','.join('?' * len(email_ids))
+            params.extend(email_ids)
+        
+        cursor.execute(query, params)
+        states = cursor.fetchall()
+        conn.close()
+        return states
+    
+    def backup(self, dest_path):
+        """نسخة احتياطية أثناء التشغيل باستخدام SQLite backup API
+
+        في وضع WAL تقرأ النسخة لقطة ثابتة دون منع خادم SMTP من الكتابة.
+        قاعدة البيانات المصدر تُفتح للقراءة فقط ولا يتم تهيئتها أو ترحيلها.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(dest_path)), exist_ok=True)
+        
+        source_uri = Path(self.db_path).resolve().as_uri() + '?mode=ro'
+        source = sqlite3.connect(source_uri, uri=True)
+        dest = sqlite3.connect(dest_path)
+        try:
+            source.backup(dest)
+        finally:
+            dest.close()
+            source.close()
+    
     def delete_expired_accounts(self):
-        """حذف الحسابات المنتهية الصلاحية"""
+        """حذف الحسابات المنتهية الصلاحية وإرجاع معرفاتها"""
         conn = self.get_connection()
         cursor = conn.cursor()
         
         cursor.execute('''
-            DELETE FROM temp_accounts 
+            SELECT id FROM temp_accounts 
             WHERE expires_at < datetime('now')
         ''')
+        account_ids = [row['id'] for row in cursor.fetchall()]
+        
+        if account_ids:
+            cursor.executemany('''
+                DELETE FROM temp_accounts WHERE id = ?
+            ''', [(account_id,) for account_id in account_ids])
+            conn.commit()
         
-        conn.commit()
         conn.close()
+        return account_ids
     
     def cleanup_database(self):
         """تنظيف قاعدة البيانات من البيانات القديمة"""
-        self.delete_expired_accounts()
+        return self.delete_expired_accounts()
@@ -0,0 +1,189 @@
+import json
+import os
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# النطاقات المستخدمة عند عدم وجود ملف إعدادات
+DEFAULT_DOMAINS = [
+    "tempmail.local",
+    "temp.local",
+    "disposable.local",
+    "10min.local",
+    "throwaway.local"
+]
+
+DEFAULT_TTL_HOURS = 24
+
+
+class DomainPolicy:
+    """سياسة نطاق: مدة صلاحية الحسابات وحصصها
+
+    catch_all: قبول أي اسم مستخدم على النطاق وإنشاء الحساب عند أول رسالة
+    """
+
+    def __init__(self, domain, ttl_hours=DEFAULT_TTL_HOURS, max_messages=None, max_bytes=None,
+                 catch_all=False):
+        self.domain = domain
+        self.ttl_hours = ttl_hours
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.catch_all = catch_all
+
+    def __repr__(self):
+        return f"DomainPolicy({self.domain!r}, ttl_hours={self.ttl_hours})"
+
+
+class DomainRouter:
+    """مطابقة عناوين المستلمين مع النطاقات المُعدة دون الوصول إلى قاعدة البيانات
+
+    صيغ النطاقات في ملف الإعدادات:
+    - "example.local": النطاق نفسه فقط
+    - "*.example.local": أي نطاق فرعي من example.local
+    - "*": أي نطاق آخر غير مُعرّف (نطاق افتراضي)
+
+    يُعاد تحميل الملف تلقائياً عند تغيره (يُفحص كل check_interval ثانية)
+    أو عبر reload().
+    """
+
+    def __init__(self, config_path=None, check_interval=5):
+        self.config_path = config_path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._next_check = 0
+        self._compiled = self._compile({'domains': [{'domain': d} for d in DEFAULT_DOMAINS]})
+        # يُقرأ ملف الإعدادات عند أول مطابقة (_maybe_reload) وليس عند الإنشاء
+
+    def reload(self):
+        """إعادة تحميل ملف الإعدادات؛ يُحتفظ بالإعدادات الحالية عند الخطأ"""
+        with self._lock:
+            mtime = None
+            try:
+                mtime = os.path.getmtime(self.config_path)
+                with open(self.config_path, encoding='utf-8') as f:
+                    config = json.load(f)
+                self._validate(config)
+                compiled = self._compile(config)
+            except Exception as e:
+                logger.error(f"Failed to load domain config {self.config_path}: {str(e)}")
+                # تسجيل وقت تعديل الملف الخاطئ حتى لا يُعاد تحميله كل check_interval
+                if mtime is not None:
+                    self._mtime = mtime
+                return False
+
+            self._compiled = compiled
+            self._mtime = mtime
+            self._next_check = time.monotonic() + self.check_interval
+            logger.info(f"Loaded {len(compiled[3])} domains from {self.config_path}")
+            return True
+
+    def _maybe_reload(self):
+        if not self.config_path or time.monotonic() < self._next_check:
+            return
+
+        self._next_check = time.monotonic() + self.check_interval
+        try:
+            mtime = os.path.getmtime(self.config_path)
+        except OSError:
+            return
+        if mtime != self._mtime:
+            self.reload()
+
+    @staticmethod
+    def _validate(config):
+        """التحقق من بنية ملف الإعدادات قبل استخدامه (يرفع ValueError)"""
+        if not isinstance(config, dict):
+            raise ValueError("config must be a JSON object")
+
+        domains = config.get('domains')
+        if not isinstance(domains, list):
+            raise ValueError("'domains' must be a list")
+
+        ttl = config.get('default_ttl_hours', DEFAULT_TTL_HOURS)
+        if isinstance(ttl, bool) or not isinstance(ttl, (int, float)) or ttl <= 0:
+            raise ValueError("'default_ttl_hours' must be a positive number")
+
+        for entry in domains:
+            if isinstance(entry, str):
+                entry = {'domain': entry}
+            if not isinstance(entry, dict):
+                raise ValueError(f"invalid domain entry: {entry!r}")
+
+            domain = entry.get('domain')
+            if not isinstance(domain, str) or not domain.strip():
+                raise ValueError(f"domain entry needs a non-empty 'domain' string: {entry!r}")
+
+            for key in ('ttl_hours', 'max_messages', 'max_bytes'):
+                value = entry.get(key)
+                if value is not None and (
+                    isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0
+                ):
+                    raise ValueError(f"'{key}' of {domain!r} must be a positive number")
+
+            if not isinstance(entry.get('catch_all', False), bool):
+                raise ValueError(f"'catch_all' of {domain!r} must be true or false")
+
+    def _compile(self, config):
+        """تحويل الإعدادات إلى (نطاقات محددة, نطاقات فرعية, النطاق الافتراضي, قائمة التوليد)"""
+        default_ttl = config.get('default_ttl_hours', DEFAULT_TTL_HOURS)
+        exact = {}
+        wildcards = {}
+        fallback = None
+        available = []
+
+        for entry in config['domains']:
+            if isinstance(entry, str):
+                entry = {'domain': entry}
+
+            domain = entry['domain'].strip().lower()
+            policy = DomainPolicy(
+                domain,
+                ttl_hours=entry.get('ttl_hours', default_ttl),
+                max_messages=entry.get('max_messages'),
+                max_bytes=entry.get('max_bytes'),
+                catch_all=bool(entry.get('catch_all', False))
+            )
+
+            if domain == '*':
+                fallback = policy
+            elif domain.startswith('*.'):
+                wildcards[domain[2:]] = policy
+            else:
+                exact[domain] = policy
+                available.append(domain)
+
+        return exact, wildcards, fallback, available
+
+    def match_domain(self, domain):
+        """سياسة النطاق أو None إذا لم يكن النطاق مُعداً"""
+        self._maybe_reload()
+        exact, wildcards, fallback, _ = self._compiled
+
+        domain = domain.strip().rstrip('.').lower()
+        policy = exact.get(domain)
+        if policy is not None:
+            return policy
+
+        if wildcards:
+            # مطابقة أطول لاحقة أولاً: a.b.example.local -> b.example.local -> example.local
+            labels = domain.split('.')
+            for i in range(1, len(labels)):
+                policy = wildcards.get('.'.join(labels[i:]))
+                if policy is not None:
+                    return policy
+
+        return fallback
+
+    def match(self, address):
+        """سياسة النطاق لعنوان بريد كامل أو None"""
+        if '@' not in address:
+            return None
+        return self.match_domain(address.rsplit('@', 1)[1])
+
+    def get_available_domains(self):
+        """النطاقات المحددة (غير wildcard) الصالحة لتوليد العناوين"""
+        self._maybe_reload()
+        return list(self._compiled[3])
@@ -0,0 +1,107 @@
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+
+class EmailDetailCache:
+    """ذاكرة تخزين مؤقت (LRU) لتفاصيل الرسائل بعد تحويلها إلى JSON
+
+    الرسائل لا تتغير بعد حفظها، لذلك يمكن إعادة استخدام الاستجابة المُسلسَلة
+    لنفس المفتاح (account_id, email_id) دون الرجوع إلى قاعدة البيانات.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._account_keys = {}
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, account_id, email_id):
+        """الحصول على الاستجابة المخزنة أو None"""
+        key = (account_id, email_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            payload, expires_at = entry
+            if self._is_expired(expires_at):
+                self._drop_account(account_id)
+                return None
+
+            self._entries.move_to_end(key)
+            return payload
+
+    def put(self, account_id, email_id, payload, expires_at=None):
+        """تخزين استجابة مُسلسَلة (bytes أو str)"""
+        size = len(payload)
+        if size > self.max_bytes:
+            return
+
+        key = (account_id, email_id)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (payload, expires_at)
+            self._account_keys.setdefault(account_id, set()).add(email_id)
+            self._size += size
+
+            while self._entries and (
+                len(self._entries) > self.max_entries or self._size > self.max_bytes
+            ):
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+
+    def invalidate(self, account_id, email_id):
+        """حذف رسالة محددة من الذاكرة المؤقتة"""
+        with self._lock:
+            key = (account_id, email_id)
+            if key in self._entries:
+                self._remove(key)
+
+    def evict_accounts(self, account_ids):
+        """حذف جميع رسائل الحسابات المحددة (عند انتهاء صلاحيتها)"""
+        with self._lock:
+            for account_id in account_ids:
+                self._drop_account(account_id)
+
+    def clear(self):
+        """تفريغ الذاكرة المؤقتة بالكامل"""
+        with self._lock:
+            self._entries.clear()
+            self._account_keys.clear()
+            self._size = 0
+
+    def stats(self):
+        """إحصائيات الذاكرة المؤقتة"""
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._size}
+
+    def _drop_account(self, account_id):
+        for email_id in list(self._account_keys.get(account_id, ())):
+            self._remove((account_id, email_id))
+
+    def _remove(self, key):
+        payload, _ = self._entries.pop(key)
+        self._size -= len(payload)
+
+        account_id, email_id = key
+        keys = self._account_keys.get(account_id)
+        if keys is not None:
+            keys.discard(email_id)
+            if not keys:
+                del self._account_keys[account_id]
+
+    @staticmethod
+    def _is_expired(expires_at):
+        if not expires_at:
+            return False
+        if isinstance(expires_at, str):
+            try:
+                expires_at = datetime.fromisoformat(expires_at)
+            except ValueError:
+                return False
+        return expires_at <= datetime.now()
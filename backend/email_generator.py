@@ -2,17 +2,14 @@ import random
 import string
 from datetime import datetime
 
+from domain_router import DomainRouter
+
 class TempEmailGenerator:
     """مولد عناوين البريد الإلكتروني المؤقت"""
     
-    def __init__(self):
-        self.domains = [
-            "tempmail.local",
-            "temp.local", 
-            "disposable.local",
-            "10min.local",
-            "throwaway.local"
-        ]
+    def __init__(self, domain_router=None):
+        # النطاقات تأتي من ملف الإعدادات (domains.json) عبر DomainRouter
+        self.domain_router = domain_router or DomainRouter()
         
         self.adjectives = [
             "quick", "fast", "temp", "rapid", "swift", "brief", "short",
@@ -24,6 +21,18 @@ class TempEmailGenerator:
             "inbox", "box", "account", "address", "user", "temp"
         ]
     
+    @property
+    def domains(self):
+        """النطاقات المتاحة حالياً للتوليد"""
+        return self.domain_router.get_available_domains()
+    
+    def choose_domain(self):
+        """اختيار نطاق عشوائي للتوليد"""
+        domains = self.domains
+        if not domains:
+            raise ValueError("No concrete domain is configured for address generation")
+        return random.choice(domains)
+    
     def generate_random_string(self, length=8):
         """توليد نص عشوائي"""
         letters = string.ascii_lowercase + string.digits
@@ -34,7 +43,7 @@ class TempEmailGenerator:
         adjective = random.choice(self.adjectives)
         noun = random.choice(self.nouns)
         number = random.randint(100, 9999)
-        domain = random.choice(self.domains)
+        domain = self.choose_domain()
         
         username = f"{adjective}{noun}{number}"
         return f"{username}@{domain}"
@@ -42,14 +51,14 @@ class TempEmailGenerator:
     def generate_random_email(self, length=10):
         """توليد بريد إلكتروني عشوائي"""
         username = self.generate_random_string(length)
-        domain = random.choice(self.domains)
+        domain = self.choose_domain()
         return f"{username}@{domain}"
     
     def generate_timestamped_email(self):
         """توليد بريد إلكتروني يحتوي على الوقت"""
         timestamp = datetime.now().strftime("%H%M%S")
         random_part = self.generate_random_string(5)
-        domain = random.choice(self.domains)
+        domain = self.choose_domain()
         
         username = f"temp{timestamp}{random_part}"
         return f"{username}@{domain}"
@@ -60,7 +69,7 @@ class TempEmailGenerator:
             prefix = "temp"
         
         middle = self.generate_random_string(6)
-        domain = random.choice(self.domains)
+        domain = self.choose_domain()
         
         if suffix:
             username = f"{prefix}{middle}{suffix}"
@@ -89,15 +98,11 @@ class TempEmailGenerator:
     
     def is_valid_temp_domain(self, email):
         """التحقق من أن النطاق صالح للبريد المؤقت"""
-        if "@" not in email:
-            return False
-        
-        domain = email.split("@")[1]
-        return domain in self.domains
+        return self.domain_router.match(email) is not None
     
     def get_available_domains(self):
         """الحصول على قائمة النطاقات المتاحة"""
-        return self.domains.copy()
+        return self.domains
 
 # للاختبار
 if __name__ == "__main__":
@@ -0,0 +1,37 @@
+import json
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # orjson اختياري
+    orjson = None
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """مزود JSON أسرع وأصغر حجماً لاستجابات API
+
+    يستخدم orjson إذا كان مثبتاً، وإلا json القياسي بصيغة مضغوطة
+    ودون تحويل الأحرف العربية إلى \\uXXXX.
+    """
+
+    ensure_ascii = False
+    sort_keys = False
+
+    def dumps_bytes(self, obj):
+        """تحويل كائن إلى JSON بصيغة bytes (UTF-8)"""
+        if orjson is not None:
+            return orjson.dumps(obj, default=self.default)
+        return json.dumps(
+            obj, default=self.default, ensure_ascii=False, separators=(',', ':')
+        ).encode('utf-8')
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.dumps(obj, default=self.default).decode('utf-8')
+        kwargs.setdefault('separators', (',', ':'))
+        return super().dumps(obj, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumps_bytes(obj), mimetype=self.mimetype)
@@ -0,0 +1,97 @@
+import math
+import threading
+import time
+from functools import wraps
+
+from flask import request, jsonify
+
+
+class RateLimiter:
+    """تحديد معدل الطلبات باستخدام Token Bucket في الذاكرة
+
+    كل bucket عبارة عن قائمة صغيرة [tokens, updated_at, refill_seconds]
+    مخزنة في dict واحد، وتُحذف الـ buckets الممتلئة (الخاملة) دورياً.
+    """
+
+    def __init__(self, eviction_interval=60):
+        self.eviction_interval = eviction_interval
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._next_eviction = time.monotonic() + eviction_interval
+
+    def consume(self, key, capacity, per_seconds):
+        """استهلاك token واحد؛ يعيد (مسموح, ثواني الانتظار)"""
+        now = time.monotonic()
+        refill_rate = capacity / per_seconds
+
+        with self._lock:
+            if now >= self._next_eviction:
+                self._evict(now)
+
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = [float(capacity), now, per_seconds]
+                self._buckets[key] = bucket
+            else:
+                bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * refill_rate)
+                bucket[1] = now
+
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return True, 0
+
+            return False, math.ceil((1 - bucket[0]) / refill_rate)
+
+    def limit(self, capacity, per_seconds, key='ip'):
+        """Decorator لتحديد معدل مسار معين
+
+        key: 'ip' لكل عنوان IP أو 'account' لكل بريد مؤقت
+        (من عنوان المسار أو حقل sender في JSON).
+        """
+        def decorator(view):
+            scope = f'{view.__name__}:{key}'
+
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                identity = self._identity(key)
+                if identity is not None:
+                    allowed, retry_after = self.consume(
+                        (scope, identity), capacity, per_seconds
+                    )
+                    if not allowed:
+                        response = jsonify({
+                            'success': False,
+                            'message': 'تم تجاوز الحد المسموح من الطلبات، حاول لاحقاً'
+                        })
+                        response.status_code = 429
+                        response.headers['Retry-After'] = str(retry_after)
+                        return response
+
+                return view(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def _identity(self, key):
+        if key == 'ip':
+            return request.remote_addr
+
+        if key == 'account':
+            address = (request.view_args or {}).get('email_address')
+            if address is None and request.is_json:
+                data = request.get_json(silent=True) or {}
+                address = data.get('sender')
+            return address.lower() if isinstance(address, str) else None
+
+        raise ValueError(f"Unknown rate limit key: {key}")
+
+    def _evict(self, now):
+        """حذف الـ buckets التي امتلأت من جديد (لا فرق بينها وبين bucket جديد)"""
+        idle = [
+            key for key, (_, updated_at, refill_seconds) in self._buckets.items()
+            if now - updated_at >= refill_seconds
+        ]
+        for key in idle:
+            del self._buckets[key]
+        self._next_eviction = now + self.eviction_interval
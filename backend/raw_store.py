@@ -0,0 +1,128 @@
+import mmap
+import os
+import threading
+import logging
+from datetime import datetime, timedelta, timezone
+
+logger = logging.getLogger(__name__)
+
+
+class RawMessageStore:
+    """أرشيف الرسائل الخام (كما وصلت) في ملفات segments تُضاف إليها فقط
+
+    كل segment يجمع رسائل الحسابات التي تنتهي صلاحيتها في نفس الساعة،
+    لذلك يُحذف الملف كاملاً بعد انتهاء تلك الساعة. موقع كل رسالة
+    (segment, offset, length) محفوظ في جدول raw_messages.
+    """
+
+    SEGMENT_FORMAT = "%Y%m%d%H"
+
+    def __init__(self, db_manager, base_dir="database/raw", chunk_size=64 * 1024):
+        self.db_manager = db_manager
+        self.base_dir = base_dir
+        self.chunk_size = chunk_size
+        self._lock = threading.Lock()
+
+    def segment_for(self, expires_at):
+        """اسم الـ segment لحساب ينتهي في expires_at (نهاية الساعة)"""
+        if isinstance(expires_at, str):
+            expires_at = datetime.fromisoformat(expires_at)
+        bucket = expires_at.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        return f"{bucket.strftime(self.SEGMENT_FORMAT)}.seg"
+
+    def append(self, email_id, data, expires_at):
+        """إضافة رسالة خام إلى نهاية الـ segment وتسجيل موقعها"""
+        segment = self.segment_for(expires_at)
+
+        with self._lock:
+            os.makedirs(self.base_dir, exist_ok=True)
+            with open(os.path.join(self.base_dir, segment), 'ab') as f:
+                offset = f.tell()
+                f.write(data)
+
+        self.db_manager.save_raw_location(email_id, segment, offset, len(data))
+        return segment, offset
+
+    def open_message(self, segment, offset, length):
+        """فتح رسالة خام عبر mmap الآن (يرفع OSError إذا لم تكن متوفرة)
+
+        تُقرأ الأجزاء لاحقاً عند المرور على الكائن المُعاد.
+        """
+        f = open(os.path.join(self.base_dir, segment), 'rb')
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError as e:
+            # mmap يرفع ValueError لملف فارغ
+            f.close()
+            raise OSError(f"Segment {segment} is empty") from e
+        except Exception:
+            f.close()
+            raise
+
+        if offset + length > len(mm):
+            mm.close()
+            f.close()
+            raise OSError(f"Segment {segment} is shorter than the indexed message")
+
+        return _MappedMessage(f, mm, offset, length, self.chunk_size)
+
+    def iter_message(self, segment, offset, length):
+        """قراءة رسالة خام على أجزاء عبر mmap دون تحميلها كاملة في الذاكرة"""
+        message = self.open_message(segment, offset, length)
+        try:
+            yield from message
+        finally:
+            message.close()
+
+    def remove_expired_segments(self, now=None):
+        """حذف الـ segments التي انتهت صلاحية جميع حساباتها"""
+        if not os.path.isdir(self.base_dir):
+            return []
+
+        # نفس ساعة قاعدة البيانات: expires_at يُقارن مع datetime('now') بتوقيت UTC
+        now = now or datetime.now(timezone.utc).replace(tzinfo=None)
+        removed = []
+
+        with self._lock:
+            for name in os.listdir(self.base_dir):
+                stem, ext = os.path.splitext(name)
+                if ext != '.seg':
+                    continue
+                try:
+                    bucket = datetime.strptime(stem, self.SEGMENT_FORMAT)
+                except ValueError:
+                    continue
+                if bucket > now:
+                    continue
+
+                try:
+                    os.remove(os.path.join(self.base_dir, name))
+                except OSError as e:
+                    # قد يكون الملف مفتوحاً للقراءة (Windows)؛ نعيد المحاولة لاحقاً
+                    logger.warning(f"Failed to remove segment {name}: {str(e)}")
+                    continue
+                removed.append(name)
+
+        if removed:
+            self.db_manager.delete_raw_locations(removed)
+        return removed
+
+
+class _MappedMessage:
+    """رسالة خام مفتوحة عبر mmap؛ close() يغلق الملف حتى لو لم تُقرأ"""
+
+    def __init__(self, f, mm, offset, length, chunk_size):
+        self._file = f
+        self._mmap = mm
+        self._offset = offset
+        self._end = offset + length
+        self._chunk_size = chunk_size
+
+    def __iter__(self):
+        for start in range(self._offset, self._end, self._chunk_size):
+            yield self._mmap[start:min(start + self._chunk_size, self._end)]
+
+    def close(self):
+        if not self._mmap.closed:
+            self._mmap.close()
+        self._file.close()
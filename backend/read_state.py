@@ -0,0 +1,116 @@
+import atexit
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ReadStateBuffer:
+    """تجميع تغييرات حالة القراءة في الذاكرة وكتابتها على دفعات
+
+    كل تغيير يظهر فوراً للقراء عبر overlay() ثم يُكتب إلى قاعدة البيانات
+    في معاملة واحدة كل flush_interval ثانية، بدلاً من UPDATE لكل رسالة.
+    """
+
+    def __init__(self, db_manager, flush_interval=2.0, max_pending=500):
+        self.db_manager = db_manager
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending = {}
+        # الدفعة قيد الكتابة؛ تبقى مرئية في overlay() حتى نجاح المعاملة
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self.thread = None
+        self._atexit_registered = False
+
+    def set_state(self, email_ids, is_read=True):
+        """تسجيل حالة القراءة لمجموعة رسائل"""
+        state = 1 if is_read else 0
+        # يبدأ thread الكتابة عند أول استخدام، حتى بدون start_services()
+        # (مثل flask run أو خوادم WSGI)
+        if self.thread is None:
+            self.start()
+
+        with self._lock:
+            for email_id in email_ids:
+                self._pending[email_id] = state
+            should_flush = len(self._pending) >= self.max_pending
+
+        if should_flush:
+            self.flush()
+
+    def mark_read(self, email_id):
+        """تحديد رسالة واحدة كمقروءة"""
+        self.set_state([email_id], True)
+
+    def overlay(self, emails):
+        """تطبيق الحالات المعلقة على رسالة أو قائمة رسائل (dict)"""
+        if not self._pending and not self._in_flight:
+            return emails
+
+        rows = [emails] if isinstance(emails, dict) else emails
+        with self._lock:
+            for row in rows:
+                state = self._pending.get(row['id'])
+                if state is None:
+                    state = self._in_flight.get(row['id'])
+                if state is not None:
+                    row['is_read'] = state
+        return emails
+
+    def flush(self):
+        """كتابة جميع الحالات المعلقة في معاملة واحدة"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                batch = self._pending
+                self._in_flight = batch
+                self._pending = {}
+
+            try:
+                self.db_manager.set_read_state_many(batch.items())
+            except Exception as e:
+                logger.error(f"Failed to flush read states: {str(e)}")
+                # إعادة الحالات دون استبدال تغييرات أحدث
+                with self._lock:
+                    for email_id, state in batch.items():
+                        self._pending.setdefault(email_id, state)
+                    self._in_flight = {}
+                return 0
+
+            with self._lock:
+                self._in_flight = {}
+            return len(batch)
+
+    def start(self):
+        """بدء thread الكتابة الدورية"""
+        if self.thread and self.thread.is_alive():
+            return
+
+        with self._flush_lock:
+            if self.thread and self.thread.is_alive():
+                return
+
+            self._stop_event.clear()
+            self.thread = threading.Thread(target=self._run)
+            self.thread.daemon = True
+            self.thread.start()
+
+            # كتابة ما تبقى عند إنهاء العملية
+            if not self._atexit_registered:
+                atexit.register(self.stop)
+                self._atexit_registered = True
+
+    def stop(self):
+        """إيقاف الكتابة الدورية وكتابة ما تبقى"""
+        self._stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=self.flush_interval + 1)
+        self.flush()
+
+    def _run(self):
+        while not self._stop_event.wait(self.flush_interval):
+            self.flush()
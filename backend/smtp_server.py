@@ -4,41 +4,124 @@ from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from aiosmtpd.controller import Controller
 from aiosmtpd.smtp import SMTP as Server
-import threading
 import logging
 import socket
+from concurrent.futures import ThreadPoolExecutor
 from database import DatabaseManager
+from domain_router import DomainPolicy
 
 # إعداد التسجيل
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# الحدود الافتراضية لاستقبال الرسائل
+MAX_MESSAGE_SIZE = 10 * 1024 * 1024          # الحجم الأقصى للرسالة (يُعلن عبر SIZE)
+MAX_MESSAGES_PER_ACCOUNT = 500               # عدد الرسائل لكل حساب
+MAX_BYTES_PER_ACCOUNT = 50 * 1024 * 1024     # الحجم الإجمالي لكل حساب
+MAX_CONNECTIONS = 50                         # الاتصالات المتزامنة
+MAX_PENDING_DELIVERIES = 100                 # الرسائل قيد الحفظ في نفس الوقت
+INGEST_WORKERS = 2                           # threads حفظ الرسائل
+
+
 class TempMailSMTPHandler:
     """معالج خادم SMTP لاستقبال الرسائل"""
     
-    def __init__(self, db_manager):
+    def __init__(self, db_manager, max_messages_per_account=MAX_MESSAGES_PER_ACCOUNT,
+                 max_bytes_per_account=MAX_BYTES_PER_ACCOUNT, max_connections=MAX_CONNECTIONS,
+                 max_pending_deliveries=MAX_PENDING_DELIVERIES, ingest_workers=INGEST_WORKERS,
+                 raw_store=None, domain_router=None):
         self.db_manager = db_manager
+        self.raw_store = raw_store
+        self.domain_router = domain_router
+        self.max_messages_per_account = max_messages_per_account
+        self.max_bytes_per_account = max_bytes_per_account
+        self.max_connections = max_connections
+        self.max_pending_deliveries = max_pending_deliveries
+        
+        # تُعدَّل فقط من thread حلقة الأحداث، لذلك لا تحتاج إلى قفل
+        self.active_connections = 0
+        self.pending_deliveries = 0
+        
+        # الحفظ في قاعدة البيانات يتم خارج حلقة الأحداث
+        self.executor = ThreadPoolExecutor(max_workers=ingest_workers)
+    
+    def is_saturated(self):
+        """هل قائمة الحفظ ممتلئة؟"""
+        return self.pending_deliveries >= self.max_pending_deliveries
+    
+    def match_domain(self, address):
+        """سياسة نطاق المستلم (None إذا لم يكن النطاق مُعداً)"""
+        if self.domain_router is None:
+            return DomainPolicy(address.rsplit('@', 1)[-1])
+        return self.domain_router.match(address)
+    
+    def is_over_quota(self, account_id, incoming_size=0, policy=None):
+        """هل تجاوز الحساب حد عدد الرسائل أو الحجم؟ (حصص النطاق لها الأولوية)"""
+        max_messages = self.max_messages_per_account
+        max_bytes = self.max_bytes_per_account
+        if policy is not None:
+            max_messages = policy.max_messages or max_messages
+            max_bytes = policy.max_bytes or max_bytes
+        
+        message_count, total_bytes = self.db_manager.get_account_usage(account_id)
+        return (
+            message_count >= max_messages
+            or total_bytes + incoming_size > max_bytes
+        )
     
     async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
         """التحقق من وجود المستلم"""
         logger.info(f"Checking recipient: {address}")
         
+        # رفض النطاقات غير المُعدة من الذاكرة قبل أي وصول إلى قاعدة البيانات
+        policy = self.match_domain(address)
+        if policy is None:
+            logger.warning(f"Relay denied for domain: {address}")
+            return '550 5.7.1 Relaying denied'
+        
+        if self.is_saturated():
+            logger.warning("Ingest queue saturated, deferring recipient")
+            return '452 4.3.1 Insufficient system resources, try again later'
+        
         # التحقق من وجود الحساب المؤقت
         account = self.db_manager.get_temp_account(address)
-        if account:
-            envelope.rcpt_tos.append(address)
-            return '250 OK'
-        else:
+        if not account:
+            # في وضع catch-all يُنشأ الحساب عند حفظ أول رسالة
+            if policy.catch_all and address.rsplit('@', 1)[0]:
+                envelope.rcpt_tos.append(address)
+                return '250 OK'
             logger.warning(f"Recipient not found: {address}")
             return '550 No such user here'
+        
+        if self.is_over_quota(account['id'], policy=policy):
+            logger.warning(f"Mailbox full: {address}")
+            return '452 4.2.2 Mailbox full'
+        
+        envelope.rcpt_tos.append(address)
+        return '250 OK'
     
     async def handle_DATA(self, server, session, envelope):
         """معالجة بيانات الرسالة"""
         logger.info(f"Receiving message from {envelope.mail_from} to {envelope.rcpt_tos}")
         
+        if self.is_saturated():
+            logger.warning("Ingest queue saturated, deferring message")
+            # 451 وليس 421: الجلسة تبقى مفتوحة، و421 مخصص لإغلاق الاتصال
+            return '451 4.3.2 Service busy, try again later'
+        
+        self.pending_deliveries += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, self._store_message, envelope)
+        finally:
+            self.pending_deliveries -= 1
+    
+    def _store_message(self, envelope):
+        """تحليل الرسالة وحفظها لكل مستلم"""
         try:
             # تحليل الرسالة
             message = email.message_from_bytes(envelope.content)
+            size = len(envelope.content)
             
             # استخراج تفاصيل الرسالة
             sender = envelope.mail_from
@@ -58,14 +141,39 @@ class TempMailSMTPHandler:
             else:
                 body = message.get_payload(decode=True).decode('utf-8', errors='ignore')
             
-            # حفظ الرسالة لكل مستلم
+            # التحقق من جميع المستلمين قبل الحفظ: إما أن تُحفظ الرسالة للجميع
+            # أو يُعاد رد مؤقت للرسالة كاملة فيعيد المرسل المحاولة دون فقدانها
+            deliveries = []
             for recipient in envelope.rcpt_tos:
+                policy = self.match_domain(recipient)
                 account = self.db_manager.get_temp_account(recipient)
+                if account:
+                    if self.is_over_quota(account['id'], size, policy):
+                        logger.warning(f"Quota exceeded for {recipient}, deferring message")
+                        return '452 4.2.2 Mailbox full'
+                elif policy is None or not policy.catch_all:
+                    logger.warning(f"Recipient no longer available: {recipient}, deferring message")
+                    return '451 4.3.0 Temporary failure, try again later'
+                deliveries.append((recipient, policy, account))
+            
+            for recipient, policy, account in deliveries:
                 if account:
                     email_id = self.db_manager.save_email(
-                        account['id'], sender, recipient, subject, body, html_body
+                        account['id'], sender, recipient, subject, body, html_body, size
                     )
-                    logger.info(f"Email saved with ID: {email_id}")
+                else:
+                    email_id, account = self.db_manager.save_email_for_address(
+                        recipient, policy.ttl_hours,
+                        sender, recipient, subject, body, html_body, size
+                    )
+                logger.info(f"Email saved with ID: {email_id}")
+                
+                # حفظ النسخة الخام (الترويسات والمحتوى كما وصل)
+                if self.raw_store is not None:
+                    try:
+                        self.raw_store.append(email_id, envelope.content, account['expires_at'])
+                    except Exception as e:
+                        logger.error(f"Failed to archive raw message {email_id}: {str(e)}")
             
             return '250 Message accepted for delivery'
             
@@ -73,62 +181,86 @@ class TempMailSMTPHandler:
             logger.error(f"Error processing email: {str(e)}")
             return '451 Error processing message'
 
+
+class LimitedSMTP(Server):
+    """جلسة SMTP ترفض الاتصالات الزائدة عن الحد برد 421"""
+    
+    _rejected = False
+    
+    def connection_made(self, transport):
+        handler = self.event_handler
+        if handler.active_connections >= handler.max_connections:
+            logger.warning("Too many SMTP connections, rejecting peer")
+            self._rejected = True
+            transport.write(b'421 4.7.0 Too many connections, try again later\r\n')
+            transport.close()
+            return
+        
+        handler.active_connections += 1
+        super().connection_made(transport)
+    
+    def connection_lost(self, error):
+        if self._rejected:
+            return
+        
+        self.event_handler.active_connections -= 1
+        super().connection_lost(error)
+
+
+class LimitedController(Controller):
+    """Controller يستخدم LimitedSMTP لكل اتصال"""
+    
+    def factory(self):
+        return LimitedSMTP(self.handler, **self.SMTP_kwargs)
+
 class SMTPServer:
     """خادم SMTP لاستقبال الرسائل"""
     
-    def __init__(self, host='localhost', port=1025):
+    def __init__(self, host='localhost', port=1025, max_message_size=MAX_MESSAGE_SIZE,
+                 db_manager=None, port_attempts=100, raw_store=None, domain_router=None,
+                 **limits):
         self.host = host
-        self.port = self.find_available_port(port)
-        self.db_manager = DatabaseManager()
-        self.handler = TempMailSMTPHandler(self.db_manager)
+        self.port = port
+        self.port_attempts = port_attempts
+        self.max_message_size = max_message_size
+        self.db_manager = db_manager or DatabaseManager()
+        self.handler = TempMailSMTPHandler(
+            self.db_manager, raw_store=raw_store, domain_router=domain_router, **limits
+        )
         self.controller = None
-        self.thread = None
     
     def find_available_port(self, start_port):
         """العثور على منفذ متاح"""
-        port = start_port
-        while port < start_port + 100:  # البحث في 100 منفذ
+        for port in range(start_port, start_port + self.port_attempts):
             try:
                 with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
                     s.bind((self.host, port))
                     return port
             except OSError:
-                port += 1
+                continue
         raise RuntimeError("No available port found")
     
     def start(self):
-        """بدء خادم SMTP"""
+        """بدء خادم SMTP (يعمل Controller في thread خاص به)"""
+        # فحص المنفذ سريع، بينما فشل Controller في الربط ينتظر ready_timeout كاملاً
+        self.port = self.find_available_port(self.port)
         logger.info(f"Starting SMTP server on {self.host}:{self.port}")
         
-        try:
-            self.controller = Controller(
-                self.handler,
-                hostname=self.host,
-                port=self.port
-            )
-            
-            # تشغيل الخادم في thread منفصل
-            self.thread = threading.Thread(target=self._run_server)
-            self.thread.daemon = True
-            self.thread.start()
-            
-            logger.info(f"SMTP server started successfully on port {self.port}")
-            
-        except Exception as e:
-            logger.error(f"Failed to start SMTP server: {str(e)}")
-            # محاولة إيجاد منفذ آخر
-            self.port = self.find_available_port(self.port + 1)
-            logger.info(f"Trying alternative port: {self.port}")
-            self.start()
-    
-    def _run_server(self):
-        """تشغيل الخادم"""
+        self.controller = LimitedController(
+            self.handler,
+            hostname=self.host,
+            port=self.port,
+            data_size_limit=self.max_message_size
+        )
         self.controller.start()
+        
+        logger.info(f"SMTP server started successfully on port {self.port}")
     
     def stop(self):
         """إيقاف خادم SMTP"""
         if self.controller:
             self.controller.stop()
+            self.controller = None
             logger.info("SMTP server stopped")
 
 # للاختبار المحلي
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+N-MAIL - نسخة احتياطية أثناء التشغيل
+Online backup
+
+ينسخ قاعدة البيانات عبر SQLite backup API دون إيقاف الخادم أو منع
+استقبال الرسائل، ثم ينسخ ملفات الأرشيف الخام (database/raw).
+
+الاستخدام:
+    python backup_db.py [مجلد النسخة الاحتياطية]
+"""
+
+import os
+import shutil
+import sys
+from datetime import datetime
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+from database import DatabaseManager
+
+def main():
+    """الدالة الرئيسية"""
+    db_path = Path(os.environ.get("DATABASE_PATH", BACKEND_DIR / "database" / "tempmail.db"))
+    if not db_path.exists():
+        print(f"❌ قاعدة البيانات غير موجودة: {db_path}")
+        sys.exit(1)
+    
+    timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    backup_dir = Path(sys.argv[1]) if len(sys.argv) > 1 else Path("backups") / timestamp
+    backup_dir.mkdir(parents=True, exist_ok=True)
+    
+    print(f"💾 نسخ قاعدة البيانات إلى {backup_dir}...")
+    DatabaseManager(str(db_path)).backup(str(backup_dir / db_path.name))
+    
+    # ملفات الأرشيف تُضاف إليها البيانات فقط، لذا يكفي نسخها بعد قاعدة البيانات
+    raw_dir = db_path.parent / "raw"
+    if raw_dir.is_dir():
+        shutil.copytree(raw_dir, backup_dir / "raw", dirs_exist_ok=True)
+    
+    print("✅ تم إنشاء النسخة الاحتياطية بنجاح")
+
+if __name__ == "__main__":
+    main()
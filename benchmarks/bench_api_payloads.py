@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+قياس حجم استجابة صندوق الوارد ووقت تسلسلها قبل وبعد التحسينات
+
+- قبل: sqlite3.Row ثم نسخة dict ثم DefaultJSONProvider بدون ضغط
+- بعد: dict_factory ثم FastJSONProvider مع gzip / brotli
+
+الاستخدام:
+    python benchmarks/bench_api_payloads.py [عدد الرسائل] [عدد التكرارات]
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from compression import ResponseCompressor, brotli
+from database import DatabaseManager, dict_factory
+from json_provider import FastJSONProvider, orjson
+
+HTML_BODY = """
+<html>
+<body>
+    <h2>مرحباً بك!</h2>
+    <p>تم إنشاء حسابك المؤقت بنجاح: <strong>{email}</strong></p>
+    <p>يمكنك الآن استقبال الرسائل على هذا العنوان.</p>
+    <table>{rows}</table>
+</body>
+</html>
+"""
+
+
+def build_database(path, message_count):
+    """إنشاء قاعدة بيانات تجريبية بحساب واحد ورسائل HTML"""
+    db = DatabaseManager(path)
+    email = "bench@tempmail.local"
+    account_id = db.create_temp_account(email)
+    rows = "".join(f"<tr><td>Item {i}</td><td>{i * 3}</td></tr>" for i in range(40))
+
+    conn = db.get_connection()
+    conn.executemany('''
+        INSERT INTO emails (temp_account_id, sender, recipient, subject, body, html_body, size)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', [
+        (account_id, "noreply@example.com", email, f"رسالة اختبار رقم {i}",
+         f"نص الرسالة رقم {i}\n" * 20, HTML_BODY.format(email=email, rows=rows), 4096)
+        for i in range(message_count)
+    ])
+    conn.commit()
+    conn.close()
+    return account_id
+
+
+def fetch_emails(path, account_id, row_factory, copy_rows):
+    conn = sqlite3.connect(path)
+    conn.row_factory = row_factory
+    cursor = conn.execute('''
+        SELECT * FROM emails WHERE temp_account_id = ? ORDER BY received_at DESC
+    ''', (account_id,))
+    emails = [dict(row) for row in cursor.fetchall()] if copy_rows else cursor.fetchall()
+    conn.close()
+    return emails
+
+
+def measure(label, iterations, build_payload):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        payload = build_payload()
+    elapsed = (time.perf_counter() - start) / iterations
+    print(f"{label:<32} {len(payload):>10,} bytes  {elapsed * 1000:8.2f} ms/request")
+
+
+def main():
+    message_count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    app = Flask(__name__)
+    default_json = DefaultJSONProvider(app)
+    fast_json = FastJSONProvider(app)
+    compressor = ResponseCompressor()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        account_id = build_database(path, message_count)
+
+        def before():
+            emails = fetch_emails(path, account_id, sqlite3.Row, copy_rows=True)
+            body = default_json.dumps({'success': True, 'emails': emails}, separators=(",", ":"))
+            return f"{body}\n".encode("utf-8")
+
+        def after(encoding=None):
+            emails = fetch_emails(path, account_id, dict_factory, copy_rows=False)
+            body = fast_json.dumps_bytes({'success': True, 'emails': emails})
+            return compressor.compress(body, encoding) if encoding else body
+
+        print(f"صندوق وارد بـ {message_count} رسالة، {iterations} تكرار")
+        print(f"orjson: {'نعم' if orjson else 'لا'}  brotli: {'نعم' if brotli else 'لا'}\n")
+        measure("before (Row + dict + json)", iterations, before)
+        measure("after (dict_factory + fast json)", iterations, after)
+        measure("after + gzip", iterations, lambda: after("gzip"))
+        if brotli is not None:
+            measure("after + brotli", iterations, lambda: after("br"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+قياس زمن بدء التشغيل: من تشغيل app.py حتى نجاح أول طلب
+
+- import: زمن استيراد backend/app.py وحده (يجب ألا يبدأ أي خدمة)
+- first request: من إنشاء العملية حتى رد /api/server-info بحالة running
+
+الاستخدام:
+    python benchmarks/bench_startup.py [عدد المحاولات]
+"""
+
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+FIRST_REQUEST_TIMEOUT = 60
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+
+def measure_import(env):
+    code = "import time; t = time.perf_counter(); import app; print(time.perf_counter() - t)"
+    output = subprocess.check_output([sys.executable, "-c", code], cwd=BACKEND_DIR, env=env)
+    return float(output.decode().strip().splitlines()[-1])
+
+
+def measure_first_request(env):
+    web_port = free_port()
+    env = dict(env, WEB_PORT=str(web_port), SMTP_PORT=str(free_port()))
+    url = f"http://localhost:{web_port}/api/server-info"
+
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "app.py"], cwd=BACKEND_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - start < FIRST_REQUEST_TIMEOUT:
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if json.load(response).get("status") == "running":
+                        return time.perf_counter() - start
+            except OSError:
+                pass
+            time.sleep(0.02)
+        raise TimeoutError("الخادم لم يستجب في الوقت المحدد")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DATABASE_PATH=os.path.join(tmp, "tempmail.db"))
+
+        import_times = [measure_import(env) for _ in range(runs)]
+        first_request_times = [measure_first_request(env) for _ in range(runs)]
+
+    print(f"{runs} محاولات (الوسيط / الأقصى)")
+    print(f"import app:     {statistics.median(import_times) * 1000:8.1f} ms / {max(import_times) * 1000:8.1f} ms")
+    print(f"first request:  {statistics.median(first_request_times) * 1000:8.1f} ms / {max(first_request_times) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
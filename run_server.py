@@ -7,6 +7,7 @@ Local Temporary Email System
 هذا الملف لتشغيل النظام بطريقة محسنة مع معالجة الأخطاء
 """
 
+import hashlib
 import os
 import sys
 import time
@@ -23,11 +24,26 @@ def check_python_version():
     print(f"✅ Python {sys.version_info.major}.{sys.version_info.minor}.{sys.version_info.micro}")
     return True
 
+REQUIREMENTS_FILE = Path(__file__).parent / "requirements.txt"
+REQUIREMENTS_STAMP = Path(__file__).parent / ".requirements.stamp"
+
+def requirements_fingerprint():
+    """بصمة ملف المتطلبات ومفسر Python الحالي"""
+    digest = hashlib.sha256(REQUIREMENTS_FILE.read_bytes())
+    digest.update(sys.executable.encode("utf-8"))
+    return digest.hexdigest()
+
 def install_requirements():
-    """تثبيت المتطلبات"""
+    """تثبيت المتطلبات (فقط إذا تغير ملف المتطلبات منذ آخر تثبيت)"""
+    fingerprint = requirements_fingerprint()
+    if REQUIREMENTS_STAMP.exists() and REQUIREMENTS_STAMP.read_text().strip() == fingerprint:
+        print("✅ المتطلبات مثبتة مسبقاً")
+        return True
+    
     print("📦 تثبيت المتطلبات...")
     try:
-        subprocess.check_call([sys.executable, "-m", "pip", "install", "-r", "requirements.txt"])
+        subprocess.check_call([sys.executable, "-m", "pip", "install", "-r", str(REQUIREMENTS_FILE)])
+        REQUIREMENTS_STAMP.write_text(fingerprint)
         print("✅ تم تثبيت جميع المتطلبات بنجاح")
         return True
     except subprocess.CalledProcessError as e: